@@ -1,9 +1,16 @@
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, HttpUrl
-import requests
-from bs4 import BeautifulSoup
+from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin, urlsplit, unquote
+import asyncio
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from pydantic import BaseModel, HttpUrl, ValidationError
+import httpx
+import orjson
+from cachetools import TTLCache
+from selectolax.lexbor import LexborHTMLParser, LexborNode
 import re
+import re2
 import os
 import logging
 from sqlalchemy import create_engine, Column, Integer, String, JSON
@@ -28,7 +35,18 @@ engine = None
 SessionLocal = None
 
 if PERSIST_DB:
-    engine = create_engine(DATABASE_URL, echo=False, future=True)
+    if DATABASE_URL.startswith("sqlite"):
+        # Persist tasks run on worker threads; SQLAlchemy's default QueuePool gives each its own connection.
+        pool_options = {"connect_args": {"check_same_thread": False}}
+    else:
+        pool_options = {"pool_size": 20, "max_overflow": 10, "pool_pre_ping": True, "pool_recycle": 1800}
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        json_serializer=lambda v: orjson.dumps(v).decode(),
+        **pool_options
+    )
     SessionLocal = sessionmaker(bind=engine)
 
     class BrandRecord(Base):
@@ -39,6 +57,24 @@ if PERSIST_DB:
 
     Base.metadata.create_all(bind=engine)
 
+# ---------------- Parsed Structures ----------------
+# Slotted dataclasses for the many small records built per page; lighter than a dict each.
+@dataclass(slots=True)
+class Card:
+    href: str
+    text: str
+
+@dataclass(slots=True)
+class FAQ:
+    q: str
+    a: str
+
+# What callers need from a successful GET, so the full httpx.Response can be released.
+@dataclass(slots=True)
+class FetchedPage:
+    status_code: int
+    text: str
+
 # ---------------- Pydantic Models ----------------
 class Product(BaseModel):
     id: Optional[int]
@@ -59,48 +95,101 @@ class BrandContext(BaseModel):
     products: List[Product] = []
     hero_products: List[Product] = []
     policies: Dict[str, Optional[str]] = {}
-    faqs: List[Dict[str, str]] = []
+    faqs: List[FAQ] = []
     social_handles: Dict[str, str] = {}
     contact: ContactInfo = ContactInfo()
     important_links: Dict[str, str] = {}
     metadata: Dict[str, Any] = {}
 
 # ---------------- FastAPI ----------------
-app = FastAPI(title="Shopify Insights Fetcher")
-
 headers = {
     "User-Agent": "Mozilla/5.0 (compatible; ShopifyInsightsFetcher/1.0; +https://example.com)"
 }
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for the app's lifetime so requests to the same store reuse keep-alive connections.
+    app.state.client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=10.0,
+        headers=headers,
+        follow_redirects=True
+    )
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+
+app = FastAPI(title="Shopify Insights Fetcher", lifespan=lifespan)
+
+# Contact patterns scan whole-page text, so they use RE2's linear-time engine; class-name patterns stay on re.
+EMAIL_RE = re2.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+PHONE_RE = re2.compile(r"\+?\d[\d\-\s()]{6,}\d")
+QUESTION_CLS_RE = re.compile('question|q\b', re.I)
+ANSWER_CLS_RE = re.compile('answer|a\b', re.I)
+
+SOCIAL_DOMAINS = (
+    ('instagram.com', 'instagram'),
+    ('facebook.com', 'facebook'),
+    ('twitter.com', 'twitter'),
+    ('x.com', 'twitter'),
+    ('tiktok.com', 'tiktok'),
+    ('youtube.com', 'youtube')
+)
+
+# Finished BrandContext results keyed by the normalized requested URL. Repeat stores skip every
+# HTTP call through this, so raw page responses are not cached separately.
+RESULT_CACHE: TTLCache = TTLCache(maxsize=512, ttl=600)
+# Resolved (non-missing) policy URLs keyed by store base URL; they rarely change, so they live longer.
+POLICY_CACHE: TTLCache = TTLCache(maxsize=512, ttl=3600)
+
 # ---------------- Helper Functions ----------------
-def safe_get(url: str, timeout: int = 10) -> Optional[requests.Response]:
+def absolute_url(base_url: str, href: str) -> str:
+    # Most storefront links are already absolute; only relative ones need a full URL parse.
+    if href.startswith(('http://', 'https://')):
+        return href
+    return urljoin(base_url, href)
+
+def link_host(href: str) -> str:
     try:
-        r = requests.get(url, headers=headers, timeout=timeout)
+        return (urlsplit(href).hostname or '').lower()
+    except ValueError:
+        return ''
+
+async def safe_get(client: httpx.AsyncClient, url: str, timeout: int = 10) -> Optional[FetchedPage]:
+    try:
+        r = await client.get(url, timeout=timeout)
         if r.status_code == 200:
-            return r
+            return FetchedPage(r.status_code, r.text)
         else:
             logger.debug(f"GET {url} returned status {r.status_code}")
             return None
-    except requests.RequestException as e:
+    except (httpx.HTTPError, httpx.InvalidURL, ValueError) as e:
+        # InvalidURL/ValueError (malformed port, host, ...) aren't HTTPErrors but mean "unreachable" all the same.
         logger.debug(f"Request failed for {url}: {e}")
         return None
 
-def fetch_products_json(base_url: str) -> List[Product]:
+async def fetch_products_json(client: httpx.AsyncClient, base_url: str) -> List[Product]:
     products: List[Product] = []
     candidate = base_url.rstrip("/") + "/products.json"
-    r = safe_get(candidate)
+    r = await safe_get(client, candidate)
     if r:
         try:
-            data = r.json()
+            data = orjson.loads(r.text)
             raw_products = data.get("products") or data.get("items") or []
             for p in raw_products:
-                prod = Product(
-                    id=p.get("id"),
-                    title=p.get("title"),
-                    handle=p.get("handle"),
-                    variants=p.get("variants"),
-                    images=[img.get("src") for img in p.get("images", [])] if p.get("images") else []
-                )
+                # The payload comes from whatever site was requested, so keep validating it.
+                try:
+                    prod = Product(
+                        id=p.get("id"),
+                        title=p.get("title"),
+                        handle=p.get("handle"),
+                        variants=p.get("variants"),
+                        images=[img.get("src") for img in (p.get("images") or [])]
+                    )
+                except ValidationError:
+                    logger.debug(f"Skipping malformed product in products.json: {p.get('id')!r}")
+                    continue
                 products.append(prod)
         except ValueError:
             logger.debug("products.json returned non-json")
@@ -108,44 +197,80 @@ def fetch_products_json(base_url: str) -> List[Product]:
         logger.debug("/products.json not available or returned non-200")
     return products
 
-def extract_links_and_text(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
-    title = soup.title.string.strip() if soup.title and soup.title.string else None
-    links = {a.get_text(strip=True): a.get('href') for a in soup.find_all('a', href=True)}
-    product_cards = []
+def first_link(node: LexborNode) -> Optional[LexborNode]:
+    # Descendants only; css_first() would also match the node itself.
+    for a in node.css('a[href]'):
+        if a != node:
+            return a
+    return None
+
+def find_by_class(node: LexborNode, pattern: re.Pattern) -> Optional[LexborNode]:
+    for tag in node.css('[class]'):
+        if tag == node:
+            continue
+        classes = tag.attributes.get('class') or ''
+        if pattern.search(classes) or any(pattern.search(c) for c in classes.split()):
+            return tag
+    return None
+
+def extract_links_and_text(tree: LexborHTMLParser, base_url: str) -> Dict[str, Any]:
+    title_tag = tree.css_first('title')
+    title = title_tag.text().strip() if title_tag and title_tag.text() else None
+    links: List[Tuple[str, str]] = []
+    seen_links = set()
+    social = {}
+    important = {}
+    emails = set()
+    phones = set()
+    for a in tree.css('a[href]'):
+        href = a.attributes.get('href') or ''
+        text = a.text(strip=True)
+        if (text, href) not in seen_links:
+            seen_links.add((text, href))
+            links.append((text, href))
+        host = link_host(href)
+        for needle, key in SOCIAL_DOMAINS:
+            if host == needle or host.endswith('.' + needle):
+                social.setdefault(key, href)
+                break
+        if not href:
+            continue
+        ltext = text.lower()
+        href_l = href.lower()
+        if href_l.startswith('mailto:'):
+            for email in unquote(href[len('mailto:'):].split('?', 1)[0]).split(','):
+                email = email.strip()
+                if email:
+                    emails.add(email)
+        elif href_l.startswith('tel:'):
+            phone = unquote(href[len('tel:'):]).strip()
+            if phone:
+                phones.add(phone)
+        if 'track' in ltext or 'track' in href_l:
+            important['order_tracking'] = absolute_url(base_url, href)
+        elif 'contact' in ltext or 'contact' in href_l:
+            important['contact'] = absolute_url(base_url, href)
+        elif 'blog' in ltext or '/blogs' in href_l:
+            important['blog'] = absolute_url(base_url, href)
+    product_cards: List[Card] = []
     selectors = ['.product-card', '.product', '.featured-product', '.grid-item', '.product-grid-item']
     for sel in selectors:
-        for card in soup.select(sel):
-            a = card.find('a', href=True)
+        for card in tree.css(sel):
+            a = first_link(card)
             if a:
-                href = a['href']
-                text = a.get_text(strip=True)
-                product_cards.append({'href': href, 'text': text})
-    for tag in soup.find_all(attrs={"data-product-handle": True}):
-        product_cards.append({'href': tag.get('data-product-handle'), 'text': tag.get_text(strip=True)})
-    emails = set(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", html))
-    phones = set(re.findall(r"\+?\d[\d\-\s()]{6,}\d", html))
+                href = a.attributes.get('href') or ''
+                text = a.text(strip=True)
+                product_cards.append(Card(href, text))
+    for tag in tree.css('[data-product-handle]'):
+        product_cards.append(Card(tag.attributes.get('data-product-handle') or '', tag.text(strip=True)))
     about_text = None
-    about_candidates = soup.find_all(lambda tag: tag.name in ['p', 'div'] and ('about' in (tag.get('id') or '').lower() or 'about' in ' '.join(tag.get('class') or []).lower()))
+    about_candidates = [tag for tag in tree.css('p, div') if 'about' in (tag.attributes.get('id') or '').lower() or 'about' in (tag.attributes.get('class') or '').lower()]
     if about_candidates:
-        about_text = ' '.join([c.get_text(strip=True) for c in about_candidates[:3]])
+        about_text = ' '.join([c.text(strip=True) for c in about_candidates[:3]])
     else:
-        desc = soup.find('meta', attrs={'name': 'description'})
-        if desc and desc.get('content'):
-            about_text = desc.get('content')
-    social = {}
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if 'instagram.com' in href:
-            social['instagram'] = href
-        elif 'facebook.com' in href:
-            social['facebook'] = href
-        elif 'twitter.com' in href or 'x.com' in href:
-            social['twitter'] = href
-        elif 'tiktok.com' in href:
-            social['tiktok'] = href
-        elif 'youtube.com' in href:
-            social['youtube'] = href
+        desc = tree.css_first('meta[name="description"]')
+        if desc and desc.attributes.get('content'):
+            about_text = desc.attributes.get('content')
     return {
         'title': title,
         'links': links,
@@ -153,68 +278,95 @@ def extract_links_and_text(html: str) -> Dict[str, Any]:
         'emails': list(emails),
         'phones': list(phones),
         'about_text': about_text,
-        'social': social
+        'social': social,
+        'important_links': important
     }
 
-def find_policy_links(base_url: str, html_links: Dict[str, str]) -> Dict[str, Optional[str]]:
-    policies = {'privacy_policy': None,'refund_policy': None,'terms_of_service': None}
+async def find_policy_links(client: httpx.AsyncClient, base_url: str, html_links: List[Tuple[str, str]]) -> Dict[str, Optional[str]]:
     base = base_url.rstrip('/')
+    policies = {'privacy_policy': None,'refund_policy': None,'terms_of_service': None}
+    cached = POLICY_CACHE.get(base, {})
+    policies.update(cached)
     patterns = {
         'privacy_policy': ['/policies/privacy-policy', '/policies/privacy-policy/'],
         'refund_policy': ['/policies/refund-policy', '/policies/refund-policy/','/policies/returns','/policies/return-policy'],
         'terms_of_service': ['/policies/terms-of-service','/policies/terms-of-service/']
     }
     for name, pats in patterns.items():
-        for k, v in html_links.items():
+        if policies[name]:
+            continue
+        for _, v in html_links:
             if not v:
                 continue
             for pat in pats:
                 if pat in v:
-                    policies[name] = requests.compat.urljoin(base, v)
-        if not policies[name]:
-            for pat in pats:
-                candidate = base + pat
-                r = safe_get(candidate)
-                if r:
-                    policies[name] = candidate
-                    break
+                    policies[name] = absolute_url(base, v)
+    # Probe every fallback URL at once; the first pattern that answers (in pattern order) wins.
+    probes = [(name, pat) for name, pats in patterns.items() if not policies[name] for pat in pats]
+    responses = await asyncio.gather(*[safe_get(client, base + pat) for _, pat in probes])
+    for (name, pat), r in zip(probes, responses):
+        if r and not policies[name]:
+            policies[name] = base + pat
+    # Only resolved URLs are cached: a miss may be a transient timeout or 5xx, so it is retried next time.
+    found = {name: url for name, url in policies.items() if url}
+    if found and found != cached:
+        POLICY_CACHE[base] = found
     return policies
 
-def try_fetch_faqs(soup: BeautifulSoup) -> List[Dict[str,str]]:
-    faqs: List[Dict[str,str]] = []
-    for details in soup.find_all('details'):
-        summary = details.find('summary')
+def find_text_contacts(tree: LexborHTMLParser) -> Tuple[List[str], List[str]]:
+    # Expects non-rendered elements (script/style/...) to be stripped already; they are noise here.
+    # Text nodes are joined with '|', which neither pattern matches, so numbers in neighbouring
+    # elements (pagination, size tables) can't merge into one fake phone number.
+    page_text = tree.root.text(separator="|", strip=True) if tree.root else ''
+    return EMAIL_RE.findall(page_text), PHONE_RE.findall(page_text)
+
+def try_fetch_faqs(tree: LexborHTMLParser) -> List[FAQ]:
+    faqs: List[FAQ] = []
+    for details in tree.css('details'):
+        summary = details.css_first('summary')
         if summary:
-            q = summary.get_text(strip=True)
-            a = details.get_text(strip=True).replace(q, '').strip()
-            faqs.append({'q': q, 'a': a})
+            q = summary.text(strip=True)
+            a = details.text(strip=True).replace(q, '').strip()
+            faqs.append(FAQ(q, a))
     if not faqs:
-        for li in soup.select('.faq, .faqs, .accordion, .question'):
-            q_tag = li.find(class_=re.compile('question|q\b', re.I))
-            a_tag = li.find(class_=re.compile('answer|a\b', re.I))
+        for li in tree.css('.faq, .faqs, .accordion, .question'):
+            q_tag = find_by_class(li, QUESTION_CLS_RE)
+            a_tag = find_by_class(li, ANSWER_CLS_RE)
             if q_tag and a_tag:
-                faqs.append({'q': q_tag.get_text(strip=True), 'a': a_tag.get_text(strip=True)})
+                faqs.append(FAQ(q_tag.text(strip=True), a_tag.text(strip=True)))
     return faqs
 
-def hero_product_matches(product_cards: List[Dict[str,str]], products: List[Product], base_url: str) -> List[Product]:
+def hero_product_matches(product_cards: List[Card], products: List[Product], handles_to_product: Dict[str, Product], base_url: str) -> List[Product]:
     heroes: List[Product] = []
     if not products:
         return heroes
-    handles_to_product = { (p.handle or '').lower(): p for p in products }
+    titles = [(p, p.title.lower()) for p in products if p.title]
+    # Significant title words -> positions in `titles`, so most cards only test a few candidates.
+    # Titles without such a word ("Hat", "Tee") can't be looked up and are always candidates.
+    title_index: Dict[str, List[int]] = {}
+    unindexed: List[int] = []
+    for i, (_, title) in enumerate(titles):
+        tokens = {token for token in title.split() if len(token) > 3}
+        if not tokens:
+            unindexed.append(i)
+        for token in tokens:
+            title_index.setdefault(token, []).append(i)
     for card in product_cards:
-        href = card.get('href') or ''
-        text = (card.get('text') or '').lower()
-        m = re.search(r'/products/([^/?#]+)', href)
+        href = card.href or ''
+        text = (card.text or '').lower()
         handle = None
-        if m:
-            handle = m.group(1).lower()
+        if '/products/' in href:
+            handle = href.split('/products/', 1)[1].split('?', 1)[0].split('#', 1)[0].split('/', 1)[0].lower()
         if handle and handle in handles_to_product:
             heroes.append(handles_to_product[handle])
             continue
-        for p in products:
-            if p.title and p.title.lower() in text:
-                heroes.append(p)
-                break
+        candidates = {i for token in text.split() for i in title_index.get(token, ())}
+        candidates.update(unindexed)
+        match = next((titles[i][0] for i in sorted(candidates) if titles[i][1] in text), None)
+        if match is None:
+            match = next((p for p, title in titles if title in text), None)
+        if match is not None:
+            heroes.append(match)
     unique = []
     seen = set()
     for h in heroes:
@@ -224,46 +376,52 @@ def hero_product_matches(product_cards: List[Dict[str,str]], products: List[Prod
             seen.add(key)
     return unique
 
+def persist_brand(url: str, raw: Dict[str, Any]) -> None:
+    try:
+        with SessionLocal() as session:
+            session.add(BrandRecord(url=url, raw=raw))
+            session.commit()
+    except Exception as e:
+        logger.error(f"DB persist error: {e}")
+
 # ---------------- API Routes ----------------
 @app.post('/fetch', response_model=BrandContext)
-def fetch_insights(payload: Dict[str, str]):
+async def fetch_insights(payload: Dict[str, str], request: Request, background_tasks: BackgroundTasks):
     website_url = payload.get('website_url')
     if not website_url:
         raise HTTPException(status_code=400, detail="website_url is required")
     if not website_url.startswith('http'):
         website_url = 'https://' + website_url
-    r = safe_get(website_url)
+    cache_key = website_url
+    if cache_key in RESULT_CACHE:
+        return RESULT_CACHE[cache_key]
+    client = request.app.state.client
+    r = await safe_get(client, website_url)
     if not r:
         if website_url.startswith('https://') and 'www.' not in website_url:
             alt = website_url.replace('https://', 'https://www.')
-            r = safe_get(alt)
+            r = await safe_get(client, alt)
             if r:
                 website_url = alt
     if not r:
         raise HTTPException(status_code=401, detail=f"Website not found or unreachable: {website_url}")
     html = r.text
-    parsed = extract_links_and_text(html)
-    products = fetch_products_json(website_url)
+    tree = LexborHTMLParser(html)
+    parsed = extract_links_and_text(tree, website_url)
+    products, policies = await asyncio.gather(
+        fetch_products_json(client, website_url),
+        find_policy_links(client, website_url, parsed.get('links', []))
+    )
     hero_candidates = parsed.get('product_cards', [])
-    hero_products = hero_product_matches(hero_candidates, products, website_url)
-    policies = find_policy_links(website_url, parsed.get('links', {}))
-    soup = BeautifulSoup(html, 'html.parser')
-    faqs = try_fetch_faqs(soup)
-    important = {}
-    for text, href in parsed.get('links', {}).items():
-        if not href:
-            continue
-        ltext = (text or '').lower()
-        href_l = href.lower()
-        if 'track' in ltext or 'track' in href_l:
-            important['order_tracking'] = requests.compat.urljoin(website_url, href)
-        if 'contact' in ltext or 'contact' in href_l:
-            important['contact'] = requests.compat.urljoin(website_url, href)
-        if 'blog' in ltext or '/blogs' in href_l:
-            important['blog'] = requests.compat.urljoin(website_url, href)
+    handles = {(p.handle or '').lower(): p for p in products}
+    hero_products = hero_product_matches(hero_candidates, products, handles, website_url)
+    faqs = try_fetch_faqs(tree)
+    # Last use of the tree: drop non-rendered elements so contact details come from visible text only.
+    tree.strip_tags(['script', 'style', 'noscript', 'template'])
+    text_emails, text_phones = find_text_contacts(tree)
     contact = ContactInfo(
-        emails=parsed.get('emails', []),
-        phones=parsed.get('phones', []),
+        emails=list(set(parsed.get('emails', [])).union(text_emails)),
+        phones=list(set(parsed.get('phones', [])).union(text_phones)),
         addresses=[]
     )
     metadata = {'found_products_count': len(products),'found_hero_count': len(hero_products)}
@@ -277,18 +435,12 @@ def fetch_insights(payload: Dict[str, str]):
         faqs=faqs,
         social_handles=parsed.get('social', {}),
         contact=contact,
-        important_links=important,
+        important_links=parsed.get('important_links', {}),
         metadata=metadata
     )
     if PERSIST_DB and SessionLocal is not None:
-        try:
-            session = SessionLocal()
-            rec = BrandRecord(url=website_url, raw=result.dict())
-            session.add(rec)
-            session.commit()
-            session.close()
-        except Exception as e:
-            logger.error(f"DB persist error: {e}")
+        background_tasks.add_task(persist_brand, website_url, result.model_dump(mode='json'))
+    RESULT_CACHE[cache_key] = result
     return result
 
 @app.get('/')